@@ -0,0 +1 @@
+GIT_REVISION = "652dffd037fbbc71fa2c2281b9ea3e8e531a6505"
@@ -20,16 +20,21 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-from typing import ClassVar, Tuple
+from dataclasses import dataclass, replace
+from typing import ClassVar, Tuple, Any, Optional, Type, Union
 
-from pytools import ImmutableRecord
+from pytools import ImmutableRecord, memoize_on_first_arg
+from pymbolic import var
+from pymbolic.mapper.stringifier import PREC_NONE
 from loopy.diagnostic import LoopyError
 
 from loopy.tools import update_persistent_hash
 from loopy.kernel import LoopKernel
-from loopy.kernel.array import ArrayBase
-from loopy.kernel.data import ValueArg, ArrayArg
+from loopy.kernel.array import ArrayBase, ArrayDimImplementationTag
+from loopy.kernel.data import ValueArg, ArrayArg, TemporaryVariable, auto
+from loopy.kernel.instruction import CallInstruction
 from loopy.symbolic import DependencyMapper, WalkMapper
+from loopy.typing import ShapeType
 
 __doc__ = """
 .. currentmodule:: loopy.kernel.function_interface
@@ -48,11 +53,15 @@ __doc__ = """
 
 # {{{ argument descriptors
 
-class ValueArgDescriptor(ImmutableRecord):
-    hash_fields = ()
+@dataclass(frozen=True)
+class ValueArgDescriptor:
+    hash_fields: ClassVar[Tuple[str, ...]] = ()
+
+    def copy(self, **kwargs: Any) -> "ValueArgDescriptor":
+        return replace(self, **kwargs)
 
     def map_expr(self, subst_mapper):
-        return self.copy()
+        return self
 
     def depends_on(self):
         return frozenset()
@@ -60,7 +69,8 @@ class ValueArgDescriptor(ImmutableRecord):
     update_persistent_hash = update_persistent_hash
 
 
-class ArrayArgDescriptor(ImmutableRecord):
+@dataclass(frozen=True)
+class ArrayArgDescriptor:
     """
     Records information about an array argument to an in-kernel callable. To be
     passed to and returned from
@@ -84,29 +94,30 @@ class ArrayArgDescriptor(ImmutableRecord):
     .. automethod:: depends_on
     """
 
-    fields = {"shape", "address_space", "dim_tags"}
-
-    def __init__(self, shape, address_space, dim_tags):
+    shape: Union[ShapeType, Type[auto], None]
+    # an AddressSpace value, but plain ints occur here as well
+    address_space: int
+    dim_tags: Optional[Tuple[ArrayDimImplementationTag, ...]]
 
-        # {{{ sanity checks
+    if __debug__:
+        # Only defined with assertions enabled, so that under "python -O"
+        # constructing a descriptor does no work beyond storing its fields.
+        def __post_init__(self):
 
-        from loopy.kernel.array import ArrayDimImplementationTag
-        from loopy.kernel.data import auto
+            # {{{ sanity checks
 
-        assert isinstance(shape, tuple) or shape in [None, auto]
-        assert isinstance(dim_tags, tuple) or dim_tags is None
+            assert isinstance(self.shape, tuple) or self.shape in [None, auto]
+            assert isinstance(self.dim_tags, tuple) or self.dim_tags is None
 
-        if dim_tags:
-            # FIXME at least vector dim tags should be supported
-            assert all(isinstance(dim_tag, ArrayDimImplementationTag) for dim_tag in
-                    dim_tags)
+            if self.dim_tags:
+                # FIXME at least vector dim tags should be supported
+                assert all(isinstance(dim_tag, ArrayDimImplementationTag)
+                           for dim_tag in self.dim_tags)
 
-        # }}}
+            # }}}
 
-        super().__init__(
-                shape=shape,
-                address_space=address_space,
-                dim_tags=dim_tags)
+    def copy(self, **kwargs: Any) -> "ArrayArgDescriptor":
+        return replace(self, **kwargs)
 
     def map_expr(self, f):
         """
@@ -130,7 +141,6 @@ class ArrayArgDescriptor(ImmutableRecord):
         Returns :class:`frozenset` of all the variable names the
         :class:`ArrayArgDescriptor` depends on.
         """
-        from loopy.kernel.data import auto
         result = set()
 
         if self.shape:
@@ -168,7 +178,6 @@ class ExpressionIsScalarChecker(WalkMapper):
             self.rec(child)
 
     def map_variable(self, expr):
-        from loopy.kernel.data import TemporaryVariable, ArrayArg, auto
         if expr.name in self.kernel.all_inames():
             # inames are scalar
             return
@@ -197,7 +206,6 @@ def get_arg_descriptor_for_expression(kernel, expr):
     """
     from loopy.symbolic import (SubArrayRef, pw_aff_to_expr,
             SweptInameStrideCollector)
-    from loopy.kernel.data import TemporaryVariable, ArrayArg
 
     if isinstance(expr, SubArrayRef):
         name = expr.subscript.aggregate.name
@@ -251,29 +259,45 @@ def get_arg_descriptor_for_expression(kernel, expr):
 
 # {{{ helper function for in-kernel callables
 
-def get_kw_pos_association(kernel):
+def _iter_args_with_positions(kernel):
     """
-    Returns a tuple of ``(kw_to_pos, pos_to_kw)`` for the arguments in
-    *kernel*.
+    Yields tuples ``(arg, pos)`` for the arguments in *kernel*, where *pos* is
+    the argument's position at a call-site. An argument that is both an input
+    and an output is yielded twice, first with its (negative) position among
+    the assignees and then with its position among the parameters.
     """
-    kw_to_pos = {}
-    pos_to_kw = {}
-
     read_count = 0
     write_count = -1
 
     for arg in kernel.args:
         if arg.is_output:
-            kw_to_pos[arg.name] = write_count
-            pos_to_kw[write_count] = arg.name
+            yield arg, write_count
             write_count -= 1
         if arg.is_input:
-            # if an argument is both input and output then kw_to_pos is
-            # overwritten with its expected position in the parameters
-            kw_to_pos[arg.name] = read_count
-            pos_to_kw[read_count] = arg.name
+            yield arg, read_count
             read_count += 1
 
+
+@memoize_on_first_arg
+def get_kw_pos_association(kernel):
+    """
+    Returns a tuple of ``(kw_to_pos, pos_to_kw)`` for the arguments in
+    *kernel*.
+
+    .. note::
+
+        The result is cached on *kernel* and shared between callers, it must
+        not be mutated.
+    """
+    kw_to_pos = {}
+    pos_to_kw = {}
+
+    for arg, pos in _iter_args_with_positions(kernel):
+        # if an argument is both input and output then kw_to_pos is
+        # overwritten with its expected position in the parameters
+        kw_to_pos[arg.name] = pos
+        pos_to_kw[pos] = arg.name
+
     return kw_to_pos, pos_to_kw
 
 # }}}
@@ -337,6 +361,13 @@ class InKernelCallable(ImmutableRecord):
 
     update_persistent_hash = update_persistent_hash
 
+    def copy(self, **kwargs):
+        if not kwargs:
+            # callables are immutable => nothing to copy
+            return self
+
+        return super().copy(**kwargs)
+
     def with_types(self, arg_id_to_dtype, clbl_inf_ctx):
         """
         :arg arg_id_to_type: a mapping from argument identifiers (integers for
@@ -444,7 +475,10 @@ class InKernelCallable(ImmutableRecord):
         raise NotImplementedError()
 
     def __hash__(self):
-        return hash(self.hash_fields)
+        # Hash only the name: the remaining fields are dicts and possibly
+        # entire kernels, which are unhashable or expensive to hash. Equal
+        # callables have equal names, so this is consistent with __eq__.
+        return hash((type(self), self.name))
 
     def with_added_arg(self, arg_dtype, arg_descr):
         """
@@ -559,7 +593,6 @@ class ScalarCallable(InKernelCallable):
                 for par, par_dtype, tgt_dtype in zip(
                     expression.parameters, par_dtypes, arg_dtypes))
 
-        from pymbolic import var
         return var(self.name_in_target)(*processed_parameters)
 
     def emit_call_insn(self, insn, target, expression_to_code_mapper):
@@ -586,10 +619,7 @@ class ScalarCallable(InKernelCallable):
         if not isinstance(target, CFamilyTarget):
             raise NotImplementedError()
 
-        from loopy.kernel.instruction import CallInstruction
         from loopy.expression import dtype_to_type_context
-        from pymbolic.mapper.stringifier import PREC_NONE
-        from pymbolic import var
 
         assert isinstance(insn, CallInstruction)
         assert self.is_ready_for_codegen()
@@ -690,6 +720,11 @@ class CallableKernel(InKernelCallable):
 
     def copy(self, subkernel=None, arg_id_to_dtype=None,
              arg_id_to_descr=None):
+        if (subkernel is None
+                and arg_id_to_dtype is None
+                and arg_id_to_descr is None):
+            return self
+
         if subkernel is None:
             subkernel = self.subkernel
         if arg_id_to_descr is None:
@@ -700,25 +735,36 @@ class CallableKernel(InKernelCallable):
         return CallableKernel(subkernel, arg_id_to_dtype, arg_id_to_descr)
 
     def with_types(self, arg_id_to_dtype, callables_table):
-        kw_to_pos, pos_to_kw = get_kw_pos_association(self.subkernel)
+        kw_to_pos, _ = get_kw_pos_association(self.subkernel)
 
         new_args = []
+        args_changed = False
         for arg in self.subkernel.args:
             kw = arg.name
             if kw in arg_id_to_dtype:
                 # id exists as kw
-                new_args.append(arg.copy(dtype=arg_id_to_dtype[kw]))
+                dtype = arg_id_to_dtype[kw]
             elif kw_to_pos[kw] in arg_id_to_dtype:
                 # id exists as positional argument
-                new_args.append(arg.copy(
-                    dtype=arg_id_to_dtype[kw_to_pos[kw]]))
+                dtype = arg_id_to_dtype[kw_to_pos[kw]]
             else:
                 new_args.append(arg)
+                continue
+
+            if dtype != arg.dtype:
+                arg = arg.copy(dtype=dtype)
+                args_changed = True
+
+            new_args.append(arg)
 
         from loopy.type_inference import (
                 infer_unknown_types_for_a_single_kernel)
-        pre_specialized_subkernel = self.subkernel.copy(
-                args=new_args)
+        if args_changed:
+            pre_specialized_subkernel = self.subkernel.copy(
+                    args=new_args)
+        else:
+            # keep the kernel's memoized analyses
+            pre_specialized_subkernel = self.subkernel
 
         # infer the types of the written variables based on the knowledge
         # of the types of the arguments supplied
@@ -728,10 +774,9 @@ class CallableKernel(InKernelCallable):
                     callables_table))
 
         new_arg_id_to_dtype = {}
-        for pos, kw in pos_to_kw.items():
-            arg = specialized_kernel.arg_dict[kw]
+        for arg, pos in _iter_args_with_positions(specialized_kernel):
             if arg.dtype:
-                new_arg_id_to_dtype[kw] = arg.dtype
+                new_arg_id_to_dtype[arg.name] = arg.dtype
                 new_arg_id_to_dtype[pos] = arg.dtype
 
         # Return the kernel call with specialized subkernel and the corresponding
@@ -750,6 +795,7 @@ class CallableKernel(InKernelCallable):
                             for i, arg in enumerate(self.subkernel.args)}
 
         new_args = self.subkernel.args[:]
+        args_changed = False
 
         for arg_id, descr in arg_id_to_descr.items():
             if isinstance(arg_id, int):
@@ -779,16 +825,23 @@ class CallableKernel(InKernelCallable):
             # }}}
 
             if isinstance(descr, ArrayArgDescriptor):
-                callee_arg = callee_arg.copy(shape=descr.shape,
-                                             dim_tags=descr.dim_tags,
-                                             address_space=descr.address_space)
+                # only copy the args whose descriptor actually changes
+                if (callee_arg.shape != descr.shape
+                        or callee_arg.dim_tags != descr.dim_tags
+                        or callee_arg.address_space != descr.address_space):
+                    new_args[kw_to_callee_idx[arg_id]] = callee_arg.copy(
+                            shape=descr.shape,
+                            dim_tags=descr.dim_tags,
+                            address_space=descr.address_space)
+                    args_changed = True
             else:
                 # do nothing for a scalar arg.
                 assert isinstance(descr, ValueArgDescriptor)
 
-            new_args[kw_to_callee_idx[arg_id]] = callee_arg
-
-        subkernel = self.subkernel.copy(args=new_args)
+        if args_changed:
+            subkernel = self.subkernel.copy(args=new_args)
+        else:
+            subkernel = self.subkernel
 
         from loopy.preprocess import traverse_to_infer_arg_descr
         subkernel, clbl_inf_ctx = traverse_to_infer_arg_descr(subkernel,
@@ -904,8 +957,6 @@ class CallableKernel(InKernelCallable):
         if not isinstance(target, CFamilyTarget):
             raise NotImplementedError()
 
-        from loopy.kernel.instruction import CallInstruction
-
         assert self.is_ready_for_codegen()
         assert isinstance(insn, CallInstruction)
 
@@ -913,30 +964,24 @@ class CallableKernel(InKernelCallable):
         parameters = insn.expression.parameters
         assignees = insn.assignees
 
-        parameters = list(parameters)
-        par_dtypes = [self.arg_id_to_dtype[i] for i, _ in enumerate(parameters)]
-        kw_to_pos, pos_to_kw = get_kw_pos_association(self.subkernel)
-
-        # insert the assignees at the required positions
-        assignee_write_count = -1
-        for i, arg in enumerate(self.subkernel.args):
-            if arg.is_output:
-                if not arg.is_input:
-                    assignee = assignees[-assignee_write_count-1]
-                    parameters.insert(i, assignee)
-                    par_dtypes.insert(i, self.arg_id_to_dtype[assignee_write_count])
-
-                assignee_write_count -= 1
+        # pass the call's parameters to the callee's inputs and the assignees
+        # to its output-only arguments, in the order of the callee's arguments
+        pars_and_dtypes = []
+        for arg, pos in _iter_args_with_positions(self.subkernel):
+            if pos >= 0:
+                pars_and_dtypes.append((parameters[pos],
+                                        self.arg_id_to_dtype[pos]))
+            elif not arg.is_input:
+                pars_and_dtypes.append((assignees[-pos-1],
+                                        self.arg_id_to_dtype[pos]))
 
         # no type casting in array calls
         from loopy.expression import dtype_to_type_context
-        from pymbolic.mapper.stringifier import PREC_NONE
-        from pymbolic import var
 
         tgt_parameters = [ecm(par, PREC_NONE, dtype_to_type_context(target,
                                                                     par_dtype),
                               par_dtype).expr
-                          for par, par_dtype in zip(parameters, par_dtypes)]
+                          for par, par_dtype in pars_and_dtypes]
 
         return var(self.subkernel.name)(*tgt_parameters), False
 
@@ -1960,12 +1960,15 @@ def infer_args_are_input_output(kernel):
     from loopy.kernel.data import ArrayArg, ValueArg, ConstantArg, ImageArg
     new_args = []
 
+    written_vars = kernel.get_written_variables()
+    read_vars = kernel.get_read_variables()
+
     for arg in kernel.args:
         if isinstance(arg, ArrayArg):
             if arg.is_output is not None:
                 assert isinstance(arg.is_output, bool)
             else:
-                if arg.name in kernel.get_written_variables():
+                if arg.name in written_vars:
                     arg = arg.copy(is_output=True)
                 else:
                     arg = arg.copy(is_output=False)
@@ -1973,9 +1976,7 @@ def infer_args_are_input_output(kernel):
             if arg.is_input is not None:
                 assert isinstance(arg.is_input, bool)
             else:
-                if arg.name in kernel.get_read_variables() or (
-                        (arg.name not in kernel.get_read_variables()) and (
-                            arg.name not in kernel.get_written_variables())):
+                if arg.name in read_vars or arg.name not in written_vars:
                     arg = arg.copy(is_input=True)
                 else:
                     arg = arg.copy(is_input=False)
@@ -22,6 +22,7 @@ THE SOFTWARE.
 
 
 from typing import ClassVar, Tuple
+import string
 
 from pymbolic import var
 import numpy as np
@@ -529,6 +530,10 @@ _REDUCTION_OPS = {
 _REDUCTION_OP_PARSERS = [
         ]
 
+# characters allowed in the type suffix of an '<op>_<type>' reduction name
+_FORCED_RESULT_TYPE_SUFFIX_CHARS = frozenset(
+        string.ascii_lowercase + string.digits + "_")
+
 
 def register_reduction_parser(parser):
     """Register a new :class:`loopy.library.reduction.ReductionOperation`.
@@ -540,18 +545,16 @@ def register_reduction_parser(parser):
 
 
 def parse_reduction_op(name):
-    import re
-
-    red_op_match = re.match(r"^([a-z]+)_([a-z0-9_]+)$", name)
-    if red_op_match:
-        op_name = red_op_match.group(1)
-
-        if op_name in _REDUCTION_OPS:
-            from warnings import warn
-            warn("Reductions with forced result types are no longer supported. "
-                    f"Encountered '{name}', which might be one.",
-                    DeprecationWarning)
-            return None
+    op_name, _, result_type = name.partition("_")
+    if (result_type
+            and op_name.isalpha()
+            and op_name in _REDUCTION_OPS
+            and _FORCED_RESULT_TYPE_SUFFIX_CHARS.issuperset(result_type)):
+        from warnings import warn
+        warn("Reductions with forced result types are no longer supported. "
+                f"Encountered '{name}', which might be one.",
+                DeprecationWarning)
+        return None
 
     if name in _REDUCTION_OPS:
         return _REDUCTION_OPS[name]()
@@ -571,8 +571,8 @@ class ArgDescrInferenceMapper(RuleAwareIdentityMapper):
                                                          new_clbl))
 
         return Call(ResolvedFunction(new_func_id),
-                    tuple(self.rec(child, expn_state)
-                          for child in expr.parameters)
+                    tuple([self.rec(child, expn_state)
+                           for child in expr.parameters])
                     + tuple(deps_as_params))
 
     def map_call_with_kwargs(self, expr):
@@ -473,6 +473,62 @@ def c_symbol_mangler(kernel, name):
 
 # {{{ function scoping
 
+_C_UNARY_MATH_FUNCTIONS = frozenset({
+        "fabs", "acos", "asin", "atan", "cos", "cosh", "sin", "sinh", "tan",
+        "tanh", "exp", "log", "log10", "sqrt", "ceil", "floor", "erf", "erfc",
+        "abs", "real", "imag", "conj"})
+
+_C_BINARY_MATH_FUNCTIONS = frozenset({
+        "fmax", "fmin", "pow", "atan2", "copysign"})
+
+
+def _make_dtype_promotion_table():
+    dtypes = [np.dtype(tp) for tp in (np.int32, np.int64, np.uint32, np.uint64,
+                                      np.float32, np.float64)]
+    return {(dtype0, dtype1): np.result_type(dtype0, dtype1)
+            for dtype0 in dtypes
+            for dtype1 in dtypes}
+
+
+_DTYPE_PROMOTIONS = _make_dtype_promotion_table()
+
+
+def _promote_dtypes(dtype0, dtype1):
+    """
+    Returns the :class:`numpy.dtype` that *dtype0* and *dtype1* promote to.
+    Common pairs are looked up in a precomputed table, avoiding the cost of
+    :func:`numpy.result_type`.
+    """
+    result = _DTYPE_PROMOTIONS.get((dtype0, dtype1))
+    if result is None:
+        result = np.result_type(dtype0, dtype1)
+    return result
+
+
+_NUMPY_TYPE_CACHE = {
+        np.dtype(tp): NumpyType(tp)
+        for tp in (np.int32, np.int64, np.float32, np.float64,
+                   np.complex64, np.complex128)}
+
+
+def _numpy_type(dtype):
+    """
+    Returns a :class:`~loopy.types.NumpyType` for the scalar
+    :class:`numpy.dtype` *dtype*, shared among all callers asking for the same
+    *dtype*.
+    """
+    try:
+        return _NUMPY_TYPE_CACHE[dtype]
+    except KeyError:
+        result = _NUMPY_TYPE_CACHE[dtype] = NumpyType(dtype)
+        return result
+
+
+# maps (name, frozenset(arg_id_to_dtype.items())) to the result of
+# CMathCallable._get_specialization
+_C_MATH_SPECIALIZATIONS = {}
+
+
 class CMathCallable(ScalarCallable):
     """
     An umbrella callable for all the math functions which can be seen in a
@@ -480,6 +536,33 @@ class CMathCallable(ScalarCallable):
     """
 
     def with_types(self, arg_id_to_dtype, callables_table):
+        # specializations only depend on the name and the argument types
+        cache_key = (self.name, frozenset(arg_id_to_dtype.items()))
+        try:
+            specialization = _C_MATH_SPECIALIZATIONS[cache_key]
+        except KeyError:
+            specialization = self._get_specialization(arg_id_to_dtype)
+            _C_MATH_SPECIALIZATIONS[cache_key] = specialization
+
+        if specialization is None:
+            # the types provided aren't mature enough to specialize the
+            # callable
+            return (
+                    self.copy(arg_id_to_dtype=arg_id_to_dtype),
+                    callables_table)
+
+        name_in_target, new_arg_id_to_dtype = specialization
+        return (
+                self.copy(name_in_target=name_in_target,
+                          arg_id_to_dtype=new_arg_id_to_dtype),
+                callables_table)
+
+    def _get_specialization(self, arg_id_to_dtype):
+        """
+        Returns a tuple ``(name_in_target, new_arg_id_to_dtype)`` for the
+        argument types *arg_id_to_dtype*, or *None* if the types aren't known
+        well enough to specialize the callable.
+        """
         name = self.name
 
         # {{{ (abs|max|min) -> (fabs|fmax|fmin)
@@ -493,9 +576,7 @@ class CMathCallable(ScalarCallable):
         # }}}
 
         # unary functions
-        if name in ["fabs", "acos", "asin", "atan", "cos", "cosh", "sin", "sinh",
-                    "tan", "tanh", "exp", "log", "log10", "sqrt", "ceil", "floor",
-                    "erf", "erfc", "abs", "real", "imag", "conj"]:
+        if name in _C_UNARY_MATH_FUNCTIONS:
 
             for id in arg_id_to_dtype:
                 if not -1 <= id <= 0:
@@ -504,9 +585,7 @@ class CMathCallable(ScalarCallable):
             if 0 not in arg_id_to_dtype or arg_id_to_dtype[0] is None:
                 # the types provided aren't mature enough to specialize the
                 # callable
-                return (
-                        self.copy(arg_id_to_dtype=arg_id_to_dtype),
-                        callables_table)
+                return None
 
             dtype = arg_id_to_dtype[0].numpy_dtype
             real_dtype = np.empty(0, dtype=dtype).real.dtype
@@ -534,14 +613,10 @@ class CMathCallable(ScalarCallable):
                 if name != "conj":
                     name = "c" + name
 
-            return (
-                    self.copy(name_in_target=name,
-                        arg_id_to_dtype={0: NumpyType(dtype), -1:
-                            NumpyType(dtype)}),
-                    callables_table)
+            return name, {0: _numpy_type(dtype), -1: _numpy_type(dtype)}
 
         # binary functions
-        elif name in ["fmax", "fmin", "pow", "atan2", "copysign"]:
+        elif name in _C_BINARY_MATH_FUNCTIONS:
 
             for id in arg_id_to_dtype:
                 if not -1 <= id <= 1:
@@ -551,13 +626,10 @@ class CMathCallable(ScalarCallable):
                     arg_id_to_dtype[0] is None or arg_id_to_dtype[1] is None):
                 # the types provided aren't mature enough to specialize the
                 # callable
-                return (
-                        self.copy(arg_id_to_dtype=arg_id_to_dtype),
-                        callables_table)
+                return None
 
-            dtype = np.result_type(*[
-                    dtype.numpy_dtype for id, dtype in arg_id_to_dtype.items()
-                    if id >= 0])
+            dtype = _promote_dtypes(arg_id_to_dtype[0].numpy_dtype,
+                                    arg_id_to_dtype[1].numpy_dtype)
             real_dtype = np.empty(0, dtype=dtype).real.dtype
 
             if name in ["fmax", "fmin", "copysign"] and dtype.kind == "c":
@@ -576,11 +648,8 @@ class CMathCallable(ScalarCallable):
                                          % (name, dtype))
             if dtype.kind == "c":
                 name = "c" + name  # cpow
-            dtype = NumpyType(dtype)
-            return (
-                    self.copy(name_in_target=name,
-                        arg_id_to_dtype={-1: dtype, 0: dtype, 1: dtype}),
-                    callables_table)
+            dtype = _numpy_type(dtype)
+            return name, {-1: dtype, 0: dtype, 1: dtype}
         elif name in ["max", "min"]:
 
             for id in arg_id_to_dtype:
@@ -591,23 +660,17 @@ class CMathCallable(ScalarCallable):
                     arg_id_to_dtype[0] is None or arg_id_to_dtype[1] is None):
                 # the types provided aren't resolved enough to specialize the
                 # callable
-                return (
-                        self.copy(arg_id_to_dtype=arg_id_to_dtype),
-                        callables_table)
+                return None
 
-            dtype = np.result_type(*[
-                    dtype.numpy_dtype for id, dtype in arg_id_to_dtype.items()
-                    if id >= 0])
+            dtype = _promote_dtypes(arg_id_to_dtype[0].numpy_dtype,
+                                    arg_id_to_dtype[1].numpy_dtype)
             if dtype.kind not in "iu":
                 # only support integers for now to avoid having to deal with NaNs
                 raise LoopyError(f"{name} does not support '{dtype}' arguments.")
 
-            return (
-                    self.copy(name_in_target=f"lpy_{name}_{dtype.name}",
-                              arg_id_to_dtype={-1: NumpyType(dtype),
-                                               0: NumpyType(dtype),
-                                               1: NumpyType(dtype)}),
-                    callables_table)
+            name_in_target = f"lpy_{name}_{dtype.name}"
+            dtype = _numpy_type(dtype)
+            return name_in_target, {-1: dtype, 0: dtype, 1: dtype}
         elif name == "isnan":
             for id in arg_id_to_dtype:
                 if not -1 <= id <= 0:
@@ -616,9 +679,7 @@ class CMathCallable(ScalarCallable):
             if 0 not in arg_id_to_dtype or arg_id_to_dtype[0] is None:
                 # the types provided aren't mature enough to specialize the
                 # callable
-                return (
-                        self.copy(arg_id_to_dtype=arg_id_to_dtype),
-                        callables_table)
+                return None
 
             dtype = arg_id_to_dtype[0].numpy_dtype
 
@@ -631,13 +692,7 @@ class CMathCallable(ScalarCallable):
             else:
                 raise LoopyTypeError(f"'isnan' does not support type {dtype}.")
 
-            return (
-                    self.copy(
-                        name_in_target=name,
-                        arg_id_to_dtype={
-                            0: NumpyType(dtype),
-                            -1: NumpyType(np.int32)}),
-                    callables_table)
+            return name, {0: _numpy_type(dtype), -1: _numpy_type(np.dtype(np.int32))}
 
     def generate_preambles(self, target):
         if self.name_in_target.startswith("lpy_max"):
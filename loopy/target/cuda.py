@@ -126,7 +126,7 @@ _CUDA_SPECIFIC_FUNCTIONS = {
 
 class CudaCallable(ScalarCallable):
 
-    def cuda_with_types(self, arg_id_to_dtype, callables_table):
+    def with_types(self, arg_id_to_dtype, callables_table):
 
         name = self.name
 
@@ -140,7 +140,7 @@ class CudaCallable(ScalarCallable):
                     raise LoopyError("%s can take only %d arguments." % (name,
                             num_args))
 
-                if dtype is not None and dtype.kind == "c":
+                if dtype is not None and dtype.is_complex():
                     raise LoopyTypeError(
                         f"'{name}' does not support complex arguments.")
 
@@ -179,10 +179,13 @@ class CudaCallable(ScalarCallable):
 
             input_dtype = arg_id_to_dtype[0]
 
-            scalar_dtype, offset, field_name = input_dtype.fields["x"]
-            return_dtype = scalar_dtype
-            return self.copy(arg_id_to_dtype={0: input_dtype, 1: input_dtype,
-                                              -1: return_dtype})
+            scalar_dtype, offset, field_name = input_dtype.numpy_dtype.fields["x"]
+            return_dtype = NumpyType(scalar_dtype)
+            return (
+                    self.copy(name_in_target=name,
+                              arg_id_to_dtype={0: input_dtype, 1: input_dtype,
+                                               -1: return_dtype}),
+                    callables_table)
 
         return (
                 self.copy(arg_id_to_dtype=arg_id_to_dtype),
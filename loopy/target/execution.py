@@ -433,9 +433,11 @@ class ExecutionWrapperGeneratorBase(ABC):
 
         strify = StringifyMapper()
 
+        written_vars = kernel.get_written_variables()
+
         for arg_name in kai.passed_arg_names:
             arg = kernel.arg_dict[arg_name]
-            is_written = arg.name in kernel.get_written_variables()
+            is_written = arg.name in written_vars
 
             if not isinstance(arg, ArrayBase):
                 args.append(arg.name)
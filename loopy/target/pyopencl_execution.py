@@ -205,10 +205,10 @@ class PyOpenCLExecutionWrapperGenerator(ExecutionWrapperGeneratorBase):
 
         if kernel.options.cl_exec_manage_array_events:
             gen("")
+            written_vars = kernel.get_written_variables()
             for arg_name in kai.passed_arg_names:
                 arg = kernel.arg_dict[arg_name]
-                if (isinstance(arg, ArrayArg)
-                        and arg.name in kernel.get_written_variables()):
+                if isinstance(arg, ArrayArg) and arg.name in written_vars:
                     gen(f"{arg.name}.add_event(_lpy_evt)")
 
     # }}}
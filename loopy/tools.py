@@ -700,8 +700,9 @@ class _CallablesUnresolver(RuleAwareIdentityMapper):
                                           " supported yet.")
 
             from pymbolic.primitives import Call
-            return Call(expr.function.function, tuple(self.rec(par, expn_state)
-                                                      for par in expr.parameters))
+            return Call(expr.function.function,
+                        tuple([self.rec(par, expn_state)
+                               for par in expr.parameters]))
         else:
             return super().map_call(expr, expn_state)
 
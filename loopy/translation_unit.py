@@ -112,7 +112,8 @@ class CallableResolver(RuleAwareIdentityMapper):
                 name = expr.function
 
         if name in self.known_callables:
-            params = tuple(self.rec(par, expn_state) for par in expr.parameters)
+            params = tuple([self.rec(par, expn_state)
+                            for par in expr.parameters])
 
             # record that we resolved a call
             self.calls_resolved.add(name)
@@ -542,6 +543,24 @@ class CallablesInferenceContext:
     def copy(self, **kwargs: Any) -> CallablesInferenceContext:
         return replace(self, **kwargs)
 
+    def _get_existing_function_id(self, clbl):
+        """
+        Returns the identifier under which *clbl* is already present in
+        *self*'s namespace, or *None* if it is not present.
+        """
+        clbl_type = type(clbl)
+        clbl_name = clbl.name
+
+        # Comparing callables might involve comparing entire kernels, so
+        # first rule out the ones that differ in their type or name.
+        for func_id, existing_clbl in self.callables.items():
+            if (type(existing_clbl) is clbl_type
+                    and existing_clbl.name == clbl_name
+                    and existing_clbl == clbl):
+                return func_id
+
+        return None
+
     def with_callable(self, old_function_id, new_clbl,
                       is_entrypoint=False):
         """
@@ -568,21 +587,21 @@ class CallablesInferenceContext:
 
         # if the callable already exists => return the function
         # identifier corresponding to that callable.
-        for func_id, clbl in self.callables.items():
-            if clbl == new_clbl:
-                renames[old_function_id] |= frozenset([func_id])
-                if isinstance(func_id, str):
-                    new_entrypoints = self.new_entrypoints
-                    if is_entrypoint:
-                        new_entrypoints |= frozenset([func_id])
-                    return (self.copy(renames=renames,
-                                      new_entrypoints=new_entrypoints),
-                            Variable(func_id),)
-                else:
-                    assert not is_entrypoint
-                    assert isinstance(func_id, ReductionOpFunction)
-                    return (self.copy(renames=renames),
-                            func_id)
+        func_id = self._get_existing_function_id(new_clbl)
+        if func_id is not None:
+            renames[old_function_id] |= frozenset([func_id])
+            if isinstance(func_id, str):
+                new_entrypoints = self.new_entrypoints
+                if is_entrypoint:
+                    new_entrypoints |= frozenset([func_id])
+                return (self.copy(renames=renames,
+                                  new_entrypoints=new_entrypoints),
+                        Variable(func_id),)
+            else:
+                assert not is_entrypoint
+                assert isinstance(func_id, ReductionOpFunction)
+                return (self.copy(renames=renames),
+                        func_id)
 
         # {{{ handle ReductionOpFunction
 
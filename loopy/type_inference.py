@@ -75,16 +75,31 @@ class FunctionNameChanger(RuleAwareIdentityMapper):
         self.calls_to_new_names = calls_to_new_names
         self.subst_expander = subst_expander
 
+        # Only calls to these functions can be renamed. Checking the function
+        # first spares expanding and hashing every other call's full
+        # expression.
+        self.renamed_functions = frozenset(call.function
+                                           for call in calls_to_new_names)
+
+        # All call-sites renamed to the same name share one ResolvedFunction.
+        self.resolved_functions = {
+                new_name: ResolvedFunction(new_name)
+                for new_name in set(calls_to_new_names.values())}
+
     def map_call(self, expr, expn_state):
         name, tag = parse_tagged_name(expr.function)
 
         if name not in self.rule_mapping_context.old_subst_rules:
+            if expr.function not in self.renamed_functions:
+                return super().map_call(expr, expn_state)
+
             expanded_expr = self.subst_expander(expn_state.apply_arg_context(expr))
             if expanded_expr in self.calls_to_new_names:
                 return type(expr)(
-                        ResolvedFunction(self.calls_to_new_names[expanded_expr]),
-                        tuple(self.rec(child, expn_state)
-                              for child in expr.parameters))
+                        self.resolved_functions[
+                            self.calls_to_new_names[expanded_expr]],
+                        tuple([self.rec(child, expn_state)
+                               for child in expr.parameters]))
             else:
                 return super().map_call(expr, expn_state)
         else:
@@ -101,6 +101,61 @@ def test_cuda_target():
                 knl).device_code())
 
 
+def test_cuda_callables():
+    from loopy.target.cuda import CudaTarget, vec
+    from loopy.kernel.function_interface import ScalarCallable
+    from loopy.types import NumpyType
+
+    knl = lp.make_kernel(
+            "{ [i]: 0<=i<n }",
+            """
+            y[i] = atan2(x[i], z[i])
+            w[i] = rsqrt(x[i])
+            d[i] = dot(a[i], b[i])
+            """,
+            [
+                lp.GlobalArg("x", np.float32, shape=lp.auto),
+                lp.GlobalArg("z", np.float64, shape=lp.auto),
+                lp.GlobalArg("a,b", vec.float4, shape=lp.auto),
+                lp.GlobalArg("y,w,d", shape=lp.auto),
+                "..."
+                ],
+            target=CudaTarget())
+
+    knl = lp.infer_unknown_types(knl)
+    clbls = {clbl.name: clbl
+             for clbl in knl.callables_table.values()
+             if isinstance(clbl, ScalarCallable)}
+
+    assert clbls["atan2"].arg_id_to_dtype[-1] == NumpyType(np.float64)
+    assert clbls["rsqrt"].arg_id_to_dtype[-1] == NumpyType(np.float32)
+    assert clbls["dot"].arg_id_to_dtype[-1] == NumpyType(np.float32)
+
+    code = lp.generate_code_v2(knl).device_code()
+    print(code)
+    assert "atan2(x[i], z[i])" in code
+    assert "rsqrt(x[i])" in code
+    assert "dot(a[i], b[i])" in code
+
+
+def test_cuda_callables_complex_args():
+    from loopy.target.cuda import CudaTarget
+    from loopy.diagnostic import LoopyTypeError
+
+    knl = lp.make_kernel(
+            "{ [i]: 0<=i<n }",
+            "y[i] = rsqrt(x[i])",
+            [
+                lp.GlobalArg("x", np.complex64, shape=lp.auto),
+                lp.GlobalArg("y", shape=lp.auto),
+                "..."
+                ],
+            target=CudaTarget())
+
+    with pytest.raises(LoopyTypeError):
+        lp.generate_code_v2(knl)
+
+
 def test_generate_c_snippet():
     from pymbolic import var
     I = var("I")  # noqa